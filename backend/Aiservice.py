@@ -1,13 +1,34 @@
+import copy
 import logging
-from typing import Any, Dict
+from collections import OrderedDict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Dict, Mapping, Optional, Tuple
 
 from Contextbuilder import build_context
-from Llmclient import call_llm
+from Llmclient import AIInsightsResponse, RESPONSE_DEFAULTS, call_llm, stream_llm
 
 logger = logging.getLogger(__name__)
 
+INSIGHTS_CACHE_SIZE = 256
 
-def _fetch_metrics(week: int) -> Dict[str, Any]:
+# Successful insights by (current_week, previous_week). Error results are
+# never stored, so a transient Groq failure is retried on the next request.
+_insights_cache: "OrderedDict[Tuple[int, int], Dict[str, Any]]" = OrderedDict()
+
+
+def _freeze(value: Any) -> Any:
+    # The _fetch_* helpers are memoized, so what they hand out must be
+    # read-only: dicts become mapping proxies and lists become tuples.
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+@lru_cache(maxsize=128)
+def _fetch_metrics(week: int) -> Mapping[str, Any]:
     base = {
         "delivery_performance": 91.5,
         "order_accuracy": 98.2,
@@ -19,12 +40,22 @@ def _fetch_metrics(week: int) -> Dict[str, Any]:
         "warehouse_utilization": 74.3,
     }
     offset = (week % 5) * 1.3
-    return {k: round(v + offset, 1) if isinstance(v, float) else v + int(offset)
-            for k, v in base.items()}
+    return _freeze({k: round(v + offset, 1) if isinstance(v, float) else v + int(offset)
+                    for k, v in base.items()})
 
 
-def _fetch_metric_tree(week: int) -> Dict[str, Any]:
-    return {
+# Every value in the tree depends on week % 2, % 3 or % 4, so the tree
+# repeats every 12 weeks and only those 12 variants are ever built.
+TREE_PERIOD = 12
+
+
+def _fetch_metric_tree(week: int) -> Mapping[str, Any]:
+    return _metric_tree_for_phase(week % TREE_PERIOD)
+
+
+@lru_cache(maxsize=TREE_PERIOD)
+def _metric_tree_for_phase(week: int) -> Mapping[str, Any]:
+    return _freeze({
         "name": "Supply Chain Performance",
         "value": "",
         "status": "normal",
@@ -58,11 +89,12 @@ def _fetch_metric_tree(week: int) -> Dict[str, Any]:
                 ],
             },
         ],
-    }
+    })
 
 
-def _fetch_root_cause(week: int) -> Dict[str, Any]:
-    return {
+@lru_cache(maxsize=128)
+def _fetch_root_cause(week: int) -> Mapping[str, Any]:
+    return _freeze({
         "primary_cause": "Dispatch time spike in Week {} due to carrier delays".format(week),
         "details": "Third-party carrier reported road network congestion affecting last-mile delivery.",
         "contributing_factors": [
@@ -70,11 +102,12 @@ def _fetch_root_cause(week: int) -> Dict[str, Any]:
             "Reduced carrier fleet availability on weekends",
             "Manual sorting errors at dispatch hub",
         ],
-    }
+    })
 
 
-def _fetch_anomalies(week: int) -> Dict[str, Any]:
-    return {
+@lru_cache(maxsize=128)
+def _fetch_anomalies(week: int) -> Mapping[str, Any]:
+    return _freeze({
         "anomalies": [
             {
                 "metric": "Dispatch Time",
@@ -87,56 +120,114 @@ def _fetch_anomalies(week: int) -> Dict[str, Any]:
                 "description": "Dropped below 90 % target for the second consecutive week.",
             },
         ]
+    })
+
+
+def _error_result(summary: str) -> Dict[str, Any]:
+    return {
+        "status": "Error",
+        "summary": summary,
+        "bottleneck": None,
+        "root_cause": None,
+        "recommendations": [],
     }
 
 
-def generate_week_insights(current_week: int, previous_week: int) -> Dict[str, Any]:
+def _cached_insights(key: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    cached = _insights_cache.get(key)
+    if cached is None:
+        return None
+    _insights_cache.move_to_end(key)
+    logger.info("Serving cached insights: current_week=%s, previous_week=%s", *key)
+    return copy.deepcopy(cached)
+
+
+def _store_insights(key: Tuple[int, int], result: Dict[str, Any]) -> Dict[str, Any]:
+    # Only results that AIInsightsResponse accepts are cached; a bad shape
+    # raises ValueError and the caller reports it as an error result.
+    result = AIInsightsResponse(**{**RESPONSE_DEFAULTS, **result}).model_dump()
+
+    _insights_cache[key] = copy.deepcopy(result)
+    if len(_insights_cache) > INSIGHTS_CACHE_SIZE:
+        _insights_cache.popitem(last=False)
+
+    return result
+
+
+def _fetch_week_data(current_week: int, previous_week: int) -> Dict[str, Any]:
+    return {
+        "current_metrics":  _fetch_metrics(current_week),
+        "previous_metrics": _fetch_metrics(previous_week),
+        "metric_tree":      _fetch_metric_tree(current_week),
+        "root_cause":       _fetch_root_cause(current_week),
+        "anomalies":        _fetch_anomalies(current_week),
+    }
+
+
+def _build_week_context(current_week: int, previous_week: int, data: Dict[str, Any]) -> str:
+    context_prefix, context_tail = build_context(
+        current_week=current_week,
+        previous_week=previous_week,
+        **data,
+    )
+    logger.debug("Built context:\n%s\n\n%s", context_prefix, context_tail)
+    return context_tail
+
+
+async def generate_week_insights(current_week: int, previous_week: int) -> Dict[str, Any]:
+    key = (current_week, previous_week)
+    cached = _cached_insights(key)
+    if cached is not None:
+        return cached
+
     logger.info("Generating insights: current_week=%s, previous_week=%s", current_week, previous_week)
 
     try:
-        current_metrics  = _fetch_metrics(current_week)
-        previous_metrics = _fetch_metrics(previous_week)
-        metric_tree      = _fetch_metric_tree(current_week)
-        root_cause       = _fetch_root_cause(current_week)
-        anomalies        = _fetch_anomalies(current_week)
+        data = _fetch_week_data(current_week, previous_week)
     except Exception as exc:
         logger.exception("Failed to fetch operational data")
-        return {
-            "status": "Error",
-            "summary": f"Data fetch error: {exc}",
-            "bottleneck": None,
-            "root_cause": None,
-            "recommendations": [],
-        }
-
-    context = build_context(
-        current_week=current_week,
-        previous_week=previous_week,
-        current_metrics=current_metrics,
-        previous_metrics=previous_metrics,
-        metric_tree=metric_tree,
-        root_cause=root_cause,
-        anomalies=anomalies,
-    )
+        return _error_result(f"Data fetch error: {exc}")
 
-    logger.debug("Built context:\n%s", context)
+    context_tail = _build_week_context(current_week, previous_week, data)
 
     try:
-        result = call_llm(context)
+        return _store_insights(key, await call_llm(context_tail))
     except Exception as exc:
         logger.exception("LLM call failed")
-        return {
-            "status": "Error",
-            "summary": f"LLM error: {exc}",
-            "bottleneck": None,
-            "root_cause": None,
-            "recommendations": [],
-        }
-
-    result.setdefault("status", "Alert")
-    result.setdefault("summary", "")
-    result.setdefault("bottleneck", None)
-    result.setdefault("root_cause", None)
-    result.setdefault("recommendations", [])
+        return _error_result(f"LLM error: {exc}")
 
-    return result
+
+async def stream_week_insights(current_week: int, previous_week: int) -> AsyncIterator[Tuple[str, Any]]:
+    # Yields ("delta", text) events while the LLM is generating, then exactly
+    # one ("result", insights) event shaped like generate_week_insights().
+    key = (current_week, previous_week)
+    cached = _cached_insights(key)
+    if cached is not None:
+        yield "result", cached
+        return
+
+    logger.info("Streaming insights: current_week=%s, previous_week=%s", current_week, previous_week)
+
+    try:
+        data = _fetch_week_data(current_week, previous_week)
+    except Exception as exc:
+        logger.exception("Failed to fetch operational data")
+        yield "result", _error_result(f"Data fetch error: {exc}")
+        return
+
+    context_tail = _build_week_context(current_week, previous_week, data)
+
+    try:
+        result = None
+        async for event, payload in stream_llm(context_tail):
+            if event == "delta":
+                yield "delta", payload
+            else:
+                result = payload
+        result = _store_insights(key, result)
+    except Exception as exc:
+        logger.exception("LLM call failed")
+        yield "result", _error_result(f"LLM error: {exc}")
+        return
+
+    yield "result", result
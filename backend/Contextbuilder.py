@@ -1,15 +1,53 @@
-def _fmt(value, suffix: str = "") -> str:
-    if value is None:
-        return "N/A"
-    return f"{value}{suffix}"
+from collections.abc import Mapping
+
+KPI_FIELDS = [
+    ("delivery_performance",  "Delivery Performance", "%"),
+    ("order_accuracy",        "Order Accuracy",       "%"),
+    ("inbound_time",          "Inbound Time",         " mins"),
+    ("picking_time",          "Picking Time",         " mins"),
+    ("packing_time",          "Packing Time",         " mins"),
+    ("dispatch_time",         "Dispatch Time",        " mins"),
+    ("on_time_delivery",      "On-Time Delivery",     "%"),
+    ("warehouse_utilization", "Warehouse Utilization","%"),
+]
+
+SECTION_TITLES = [
+    "=== KPI COMPARISON ===",
+    "=== METRIC TREE (Hierarchy) ===",
+    "=== ROOT CAUSE ANALYSIS ===",
+    "=== DETECTED ANOMALIES ===",
+    "=== WEEKS COMPARED ===",
+]
+
+WEEK_DATA_MARKER = "=== WEEK DATA ==="
+
+KPI_ROWS = [(key, f"  {label:<25}: Current=", suffix) for key, label, suffix in KPI_FIELDS]
+
+ROOT_CAUSE_KEYS = frozenset({
+    "primary_cause", "root_cause", "cause",
+    "contributing_factors", "factors",
+    "details", "explanation", "description",
+})
+
+BAD_STATES = frozenset({"warning", "critical", "alert", "bad"})
+INDENTS    = ["  " * depth for depth in range(8)]
+
+
+def _build_context_prefix() -> str:
+    # Invariant across weeks: keep it byte-identical so the LLM provider can
+    # reuse its cached prompt prefix; only the tail changes between calls.
+    lines = [
+        "=== CONTEXT LAYOUT ===",
+        f"The operational data follows the {WEEK_DATA_MARKER} marker, in these sections:",
+    ]
+    lines += [f"  {title}" for title in SECTION_TITLES]
+    lines += ["", "KPI fields, always listed in this order (label: unit):"]
+    lines += [f"  {label:<25}: {suffix.strip()}" for _, label, suffix in KPI_FIELDS]
+    lines += ["", "Values that are unavailable for a week are reported as N/A."]
+    return "\n".join(lines)
 
 
-def _delta(current, previous, suffix: str = "") -> str:
-    if current is None or previous is None:
-        return ""
-    diff = current - previous
-    sign = "+" if diff >= 0 else ""
-    return f" ({sign}{diff:.1f}{suffix} vs previous week)"
+CONTEXT_PREFIX = _build_context_prefix()
 
 
 def build_context(
@@ -20,119 +58,110 @@ def build_context(
     metric_tree: dict,
     root_cause: dict,
     anomalies: dict,
-) -> str:
-    sections = []
+) -> tuple[str, str]:
+    # Every line goes into one buffer and is joined once at the end; a blank
+    # entry separates sections.
+    buf = [WEEK_DATA_MARKER, "", SECTION_TITLES[0]]
+    append = buf.append
 
     c = current_metrics or {}
     p = previous_metrics or {}
 
-    kpi_lines = [
-        f"  Current Week  : Week {current_week}",
-        f"  Previous Week : Week {previous_week}",
-        "",
-    ]
-
-    kpi_fields = [
-        ("delivery_performance",  "Delivery Performance", "%"),
-        ("order_accuracy",        "Order Accuracy",       "%"),
-        ("inbound_time",          "Inbound Time",         " mins"),
-        ("picking_time",          "Picking Time",         " mins"),
-        ("packing_time",          "Packing Time",         " mins"),
-        ("dispatch_time",         "Dispatch Time",        " mins"),
-        ("on_time_delivery",      "On-Time Delivery",     "%"),
-        ("warehouse_utilization", "Warehouse Utilization","%"),
-    ]
-
-    for key, label, suffix in kpi_fields:
+    # Missing values print as N/A rather than dropping the row, so the section
+    # always has one line per KPI field, as the context prefix promises.
+    for key, row_head, suffix in KPI_ROWS:
         cur_val = c.get(key)
         prv_val = p.get(key)
-        if cur_val is not None or prv_val is not None:
-            line = (
-                f"  {label:<25}: "
-                f"Current={_fmt(cur_val, suffix)}  |  "
-                f"Previous={_fmt(prv_val, suffix)}"
-                f"{_delta(cur_val, prv_val, suffix)}"
+        if cur_val is None or prv_val is None:
+            cur_s = "N/A" if cur_val is None else f"{cur_val}{suffix}"
+            prv_s = "N/A" if prv_val is None else f"{prv_val}{suffix}"
+            append(f"{row_head}{cur_s}  |  Previous={prv_s}")
+        else:
+            diff = cur_val - prv_val
+            sign = "+" if diff >= 0 else ""
+            append(
+                f"{row_head}{cur_val}{suffix}  |  Previous={prv_val}{suffix}"
+                f" ({sign}{diff:.1f}{suffix} vs previous week)"
             )
-            kpi_lines.append(line)
 
-    sections.append("=== KPI COMPARISON ===\n" + "\n".join(kpi_lines))
-
-    tree_lines = []
+    append("")
+    append(SECTION_TITLES[1])
+    start = len(buf)
     if metric_tree:
-        def _flatten_tree(node, depth=0):
-            indent = "  " * depth
+        if isinstance(metric_tree, Mapping):
+            stack = [(metric_tree, 0)]
+        elif isinstance(metric_tree, (list, tuple)):
+            stack = [(node, 0) for node in reversed(metric_tree)]
+        else:
+            stack = []
+
+        # Depth-first with an explicit stack; children are pushed reversed so
+        # they are emitted in their original order.
+        while stack:
+            node, depth = stack.pop()
+            indent = INDENTS[depth] if depth < len(INDENTS) else "  " * depth
             name   = node.get("name") or node.get("metric") or str(node)
             value  = node.get("value") or node.get("current_value", "")
             status = node.get("status") or node.get("health") or ""
-            flag   = " ⚠" if str(status).lower() in ("warning", "critical", "alert", "bad") else ""
-            tree_lines.append(f"{indent}- {name}: {value}{flag}")
-            for child in node.get("children", []):
-                _flatten_tree(child, depth + 1)
-
-        if isinstance(metric_tree, dict):
-            _flatten_tree(metric_tree)
-        elif isinstance(metric_tree, list):
-            for node in metric_tree:
-                _flatten_tree(node)
-
-    sections.append(
-        "=== METRIC TREE (Hierarchy) ===\n"
-        + ("\n".join(tree_lines) if tree_lines else "  No metric tree data available.")
-    )
-
-    rc_lines = []
+            flag   = " ⚠" if str(status).lower() in BAD_STATES else ""
+            append(f"{indent}- {name}: {value}{flag}")
+            children = node.get("children")
+            if children:
+                stack.extend((child, depth + 1) for child in reversed(children))
+    if len(buf) == start:
+        append("  No metric tree data available.")
+
+    append("")
+    append(SECTION_TITLES[2])
+    start = len(buf)
     if root_cause:
         primary      = root_cause.get("primary_cause") or root_cause.get("root_cause") or root_cause.get("cause")
         contributing = root_cause.get("contributing_factors") or root_cause.get("factors") or []
         details      = root_cause.get("details") or root_cause.get("explanation") or root_cause.get("description")
 
         if primary:
-            rc_lines.append(f"  Primary Cause     : {primary}")
+            append(f"  Primary Cause     : {primary}")
         if details:
-            rc_lines.append(f"  Details           : {details}")
+            append(f"  Details           : {details}")
         if contributing:
-            rc_lines.append("  Contributing Factors:")
-            for factor in (contributing if isinstance(contributing, list) else [contributing]):
-                rc_lines.append(f"    - {factor}")
-
-        skip_keys = {
-            "primary_cause", "root_cause", "cause",
-            "contributing_factors", "factors",
-            "details", "explanation", "description",
-        }
-        for k, v in root_cause.items():
-            if k not in skip_keys and v:
-                rc_lines.append(f"  {k}: {v}")
+            append("  Contributing Factors:")
+            for factor in (contributing if isinstance(contributing, (list, tuple)) else [contributing]):
+                append(f"    - {factor}")
 
-    sections.append(
-        "=== ROOT CAUSE ANALYSIS ===\n"
-        + ("\n".join(rc_lines) if rc_lines else "  No root cause data available.")
-    )
-
-    anomaly_lines = []
+        for k, v in root_cause.items():
+            if k not in ROOT_CAUSE_KEYS and v:
+                append(f"  {k}: {v}")
+    if len(buf) == start:
+        append("  No root cause data available.")
+
+    append("")
+    append(SECTION_TITLES[3])
+    start = len(buf)
     if anomalies:
         items = (
             anomalies.get("anomalies")
             or anomalies.get("items")
-            or (anomalies if isinstance(anomalies, list) else [])
+            or (anomalies if isinstance(anomalies, (list, tuple)) else [])
         )
-        if isinstance(items, list) and items:
+        if isinstance(items, (list, tuple)) and items:
             for a in items:
-                if isinstance(a, dict):
+                if isinstance(a, Mapping):
                     metric   = a.get("metric") or a.get("name") or "Unknown metric"
                     severity = a.get("severity") or a.get("level") or ""
                     desc     = a.get("description") or a.get("details") or a.get("message") or ""
-                    anomaly_lines.append(f"  [{severity.upper() or 'ANOMALY'}] {metric}: {desc}")
+                    append(f"  [{severity.upper() or 'ANOMALY'}] {metric}: {desc}")
                 else:
-                    anomaly_lines.append(f"  - {a}")
-        elif isinstance(anomalies, dict) and not items:
+                    append(f"  - {a}")
+        elif isinstance(anomalies, Mapping) and not items:
             for k, v in anomalies.items():
                 if v:
-                    anomaly_lines.append(f"  {k}: {v}")
+                    append(f"  {k}: {v}")
+    if len(buf) == start:
+        append("  No anomalies detected.")
 
-    sections.append(
-        "=== DETECTED ANOMALIES ===\n"
-        + ("\n".join(anomaly_lines) if anomaly_lines else "  No anomalies detected.")
-    )
+    append("")
+    append(SECTION_TITLES[4])
+    append(f"  Current Week  : Week {current_week}")
+    append(f"  Previous Week : Week {previous_week}")
 
-    return "\n\n".join(sections)
+    return CONTEXT_PREFIX, "\n".join(buf)
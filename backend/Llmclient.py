@@ -1,11 +1,25 @@
+import io
 import os
+import copy
 import json
-import re
+import hashlib
 import logging
-from openai import OpenAI
+from collections import OrderedDict
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+
+from Contextbuilder import CONTEXT_PREFIX
 
 logger = logging.getLogger(__name__)
 
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+MODEL = "llama-3.3-70b-versatile"
+TEMPERATURE = 0.2
+RESPONSE_CACHE_SIZE = 256
+
 SYSTEM_PROMPT = (
     "You are a supply chain operations expert. Analyze the data and provide:\n"
     "1. Overall performance summary\n"
@@ -26,39 +40,150 @@ SYSTEM_PROMPT = (
 )
 
 
+class AIInsightsResponse(BaseModel):
+    status: str
+    summary: str
+    bottleneck: Optional[str] = None
+    root_cause: Optional[str] = None
+    recommendations: List[str]
+
+
+# Filled in for keys the model leaves out of an otherwise valid reply.
+RESPONSE_DEFAULTS = {
+    "status": "Alert",
+    "summary": "",
+    "bottleneck": None,
+    "root_cause": None,
+    "recommendations": [],
+}
+
+# Sent verbatim as the system message on every call. Groq's OpenAI-compatible
+# endpoint has no cache_control hint, but caches identical prompt prefixes
+# automatically, so nothing week-specific may ever end up in here.
+STATIC_PREFIX = f"{SYSTEM_PROMPT}\n\n{CONTEXT_PREFIX}"
+
+# Parsed responses keyed by a digest of the full prompt. Week contexts are
+# deterministic, so an exact match is the only safe reuse criterion.
+_RESPONSE_CACHE: "OrderedDict[str, dict]" = OrderedDict()
+
+_CLIENT: Optional[AsyncOpenAI] = None
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _cache_key(context_tail: str) -> str:
+    prompt = f"{MODEL}\0{TEMPERATURE}\0{STATIC_PREFIX}\0{context_tail}"
+    return hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+
+
 def _extract_json(text: str) -> dict:
-    clean = re.sub(r"```(?:json)?\s*", "", text).strip().rstrip("`").strip()
-    match = re.search(r"\{.*\}", clean, re.DOTALL)
-    if match:
-        return json.loads(match.group())
-    raise ValueError(f"No valid JSON found in LLM response: {text[:200]}")
-
-
-def call_llm(context: str) -> dict:
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise EnvironmentError(
-            "GROQ_API_KEY environment variable is not set. "
-            "Set it before running: set GROQ_API_KEY=your-key"
+    # raw_decode stops at the end of the object, so markdown fences or prose
+    # around it need no stripping and parsing stays linear in the JSON size.
+    # Only the first "{" is tried: retrying at later braces would turn a
+    # truncated reply into one of its nested objects.
+    start = text.find("{")
+    if start < 0:
+        raise ValueError(f"No valid JSON found in LLM response: {text[:200]}")
+    try:
+        obj, _ = _JSON_DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        raise ValueError(f"No valid JSON found in LLM response: {text[:200]}") from None
+    return obj
+
+
+def _get_client() -> AsyncOpenAI:
+    global _CLIENT
+    if _CLIENT is None:
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise EnvironmentError(
+                "GROQ_API_KEY environment variable is not set. "
+                "Set it before running: set GROQ_API_KEY=your-key"
+            )
+        # One client per process keeps the connection pool (and its TLS
+        # sessions) alive across requests instead of rebuilding it per call.
+        _CLIENT = AsyncOpenAI(
+            api_key=api_key,
+            base_url=GROQ_BASE_URL,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+            ),
         )
+    return _CLIENT
 
-    client = OpenAI(
-        api_key=api_key,
-        base_url="https://api.groq.com/openai/v1",
-    )
 
-    full_prompt = f"OPERATIONAL DATA:\n{context}"
+async def close_client():
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.close()
+        _CLIENT = None
+
 
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
+async def _create_completion(context_tail: str, stream: bool = False):
+    return await _get_client().chat.completions.create(
+        model=MODEL,
         messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user",   "content": full_prompt},
+            {"role": "system", "content": STATIC_PREFIX},
+            {"role": "user",   "content": context_tail},
         ],
-        temperature=0.2,
+        temperature=TEMPERATURE,
+        stream=stream,
     )
 
-    raw_text = response.choices[0].message.content
+
+def _cached_response(key: str) -> Optional[dict]:
+    cached = _RESPONSE_CACHE.get(key)
+    if cached is None:
+        return None
+    _RESPONSE_CACHE.move_to_end(key)
+    logger.debug("LLM response cache hit: %s", key)
+    return copy.deepcopy(cached)
+
+
+def _store_response(key: str, raw_text: str) -> dict:
     logger.debug("Raw LLM response:\n%s", raw_text)
-    return _extract_json(raw_text)
-    
+    # Checked against AIInsightsResponse before caching: a reply with the
+    # wrong shape raises here (pydantic's ValidationError is a ValueError)
+    # instead of being served from the cache on every repeat request.
+    result = AIInsightsResponse(**{**RESPONSE_DEFAULTS, **_extract_json(raw_text)}).model_dump()
+
+    _RESPONSE_CACHE[key] = copy.deepcopy(result)
+    if len(_RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+        _RESPONSE_CACHE.popitem(last=False)
+
+    return result
+
+
+async def call_llm(context_tail: str) -> dict:
+    key = _cache_key(context_tail)
+    cached = _cached_response(key)
+    if cached is not None:
+        return cached
+
+    response = await _create_completion(context_tail)
+    return _store_response(key, response.choices[0].message.content)
+
+
+async def stream_llm(context_tail: str) -> AsyncIterator[Tuple[str, Any]]:
+    # Yields ("delta", text) events as Groq generates the response, then one
+    # ("result", parsed) event once the stream is exhausted. The parsed result
+    # is also cached for later call_llm()/stream_llm() calls with this tail.
+    key = _cache_key(context_tail)
+    cached = _cached_response(key)
+    if cached is not None:
+        yield "delta", json.dumps(cached)
+        yield "result", cached
+        return
+
+    # The context manager closes the HTTP response even when the consumer
+    # abandons the generator (e.g. the SSE client disconnects), so the
+    # connection goes back to the pool right away rather than at GC time.
+    buf = io.StringIO()
+    async with await _create_completion(context_tail, stream=True) as stream:
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                buf.write(delta)
+                yield "delta", delta
+
+    yield "result", _store_response(key, buf.getvalue())
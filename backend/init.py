@@ -1,5 +1,5 @@
-from Aiservice import generate_week_insights
-from Llmclient import call_llm
+from Aiservice import generate_week_insights, stream_week_insights
+from Llmclient import call_llm, stream_llm
 from Contextbuilder import build_context
 
-__all__ = ["generate_week_insights", "call_llm", "build_context"]
+__all__ = ["generate_week_insights", "stream_week_insights", "call_llm", "stream_llm", "build_context"]
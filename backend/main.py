@@ -1,15 +1,18 @@
+import json
 from contextlib import asynccontextmanager
-from typing import Optional, List
+from typing import Dict, FrozenSet, Optional, List
 import pandas as pd
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
-from metrics import calculate_week_metrics, metric_tree, compare_weeks
+from metrics import WeekMetrics, calculate_week_metrics, compare_weeks, load_data
 from root_cause import root_cause_analysis
 from simulation import simulate_load
 from model import detect_anomalies
-from Aiservice import generate_week_insights
+from Aiservice import generate_week_insights, stream_week_insights
+from Llmclient import AIInsightsResponse, close_client
 
 
 # -----------------------
@@ -18,21 +21,44 @@ from Aiservice import generate_week_insights
 
 class AppState:
     df: Optional[pd.DataFrame] = None
+    week_set: FrozenSet[int] = frozenset()
+    weeks_sorted: List[int] = []
+    week_count: int = 0
+    metrics_by_week: Dict[int, WeekMetrics] = {}
+    tree_by_week: Dict[int, dict] = {}
 
 state = AppState()
 
 
+def load_state(path: str = "sample_Data.csv"):
+    # The CSV is read-only for the lifetime of the process, so every week's
+    # metrics are computed once here; call again to pick up a new file.
+    df = load_data(path)
+    state.week_set = frozenset(int(w) for w in df["week"].unique())
+    state.weeks_sorted = sorted(state.week_set)
+    state.week_count = len(state.week_set)
+    state.metrics_by_week = {w: calculate_week_metrics(w, df=df) for w in state.weeks_sorted}
+    state.tree_by_week = {w: m.to_metric_tree() for w, m in state.metrics_by_week.items()}
+    state.df = df
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    state.df = pd.read_csv("sample_Data.csv")
+    load_state()
     yield
+    await close_client()
     state.df = None
+    state.week_set = frozenset()
+    state.weeks_sorted = []
+    state.week_count = 0
+    state.metrics_by_week = {}
+    state.tree_by_week = {}
 
 
 app = FastAPI(
     title="Supply Chain Intelligence API",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
 )
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -53,14 +79,6 @@ class SimulateRequest(BaseModel):
     order_increase_pct: float
 
 
-class AIInsightsResponse(BaseModel):
-    status: str
-    summary: str
-    bottleneck: Optional[str] = None
-    root_cause: Optional[str] = None
-    recommendations: List[str]
-
-
 # -----------------------
 # HELPERS
 # -----------------------
@@ -71,8 +89,8 @@ def get_df():
     return state.df
 
 
-def validate_week(week: int, df: pd.DataFrame):
-    if week not in df["week"].unique():
+def validate_week(week: int):
+    if week not in state.week_set:
         raise HTTPException(status_code=404, detail="Week not found.")
 
 
@@ -85,45 +103,47 @@ def health():
     df = get_df()
     return {
         "status": "ok",
-        "weeks_loaded": df["week"].nunique(),
+        "weeks_loaded": state.week_count,
         "total_records": len(df)
     }
 
 
 @app.get("/weeks")
 def weeks():
-    df = get_df()
-    return {"weeks": sorted(df["week"].unique().tolist())}
+    get_df()
+    return {"weeks": state.weeks_sorted}
 
 
 # -----------------------
 # METRICS
 # -----------------------
 
-@app.get("/metrics/{week}")
-def metrics(week: int):
-    df = get_df()
-    validate_week(week, df)
-    return calculate_week_metrics(week, df=df).to_dict()
-
-
-@app.get("/metrics/{week}/tree")
-def tree(week: int):
-    df = get_df()
-    validate_week(week, df)
-    return metric_tree(week, df=df)
-
-
+# Registered before /metrics/{week}, which would otherwise capture
+# "compare" as a week and reject it.
 @app.get("/metrics/compare")
 def compare(weeks: str = Query(...)):
     df = get_df()
     week_list = [int(w.strip()) for w in weeks.split(",")]
 
     for w in week_list:
-        validate_week(w, df)
+        validate_week(w)
 
     result = compare_weeks(week_list, df=df)
-    return result.reset_index().to_dict(orient="records")
+    return Response(result.reset_index().to_json(orient="records"), media_type="application/json")
+
+
+@app.get("/metrics/{week}")
+def metrics(week: int):
+    get_df()
+    validate_week(week)
+    return state.metrics_by_week[week].to_dict()
+
+
+@app.get("/metrics/{week}/tree")
+def tree(week: int):
+    get_df()
+    validate_week(week)
+    return state.tree_by_week[week]
 
 
 # -----------------------
@@ -133,8 +153,8 @@ def compare(weeks: str = Query(...)):
 @app.get("/root-cause")
 def root_cause(current_week: int, previous_week: int):
     df = get_df()
-    validate_week(current_week, df)
-    validate_week(previous_week, df)
+    validate_week(current_week)
+    validate_week(previous_week)
 
     report = root_cause_analysis(current_week, previous_week, df=df)
 
@@ -157,14 +177,15 @@ def root_cause(current_week: int, previous_week: int):
 @app.post("/simulate/{week}")
 def simulate(week: int, body: SimulateRequest):
     df = get_df()
-    validate_week(week, df)
+    validate_week(week)
 
-    result = simulate_load(week, body.order_increase_pct, df=df)
+    baseline = state.metrics_by_week[week]
+    result = simulate_load(week, body.order_increase_pct, df=df, baseline=baseline)
 
     return {
         "week": week,
         "order_increase_pct": body.order_increase_pct,
-        "baseline_delivery": calculate_week_metrics(week, df=df).delivery_score,
+        "baseline_delivery": baseline.delivery_score,
         "simulated_delivery": result.delivery_score,
         "delivery_delta": result.delivery_delta,
         "risk_level": result.risk_level,
@@ -180,7 +201,7 @@ def anomalies(week: Optional[int] = None):
     df = get_df()
 
     if week is not None:
-        validate_week(week, df)
+        validate_week(week)
 
     report = detect_anomalies(df=df, week_filter=week)
 
@@ -196,18 +217,39 @@ def anomalies(week: Optional[int] = None):
 # AI INSIGHTS
 # -----------------------
 
-@app.get("/ai/insights", response_model=AIInsightsResponse)
-def ai_insights(current_week: int, previous_week: int):
-    df = get_df()
+def validate_insight_weeks(current_week: int, previous_week: int):
+    get_df()
 
-    validate_week(current_week, df)
-    validate_week(previous_week, df)
+    validate_week(current_week)
+    validate_week(previous_week)
 
     if current_week == previous_week:
         raise HTTPException(status_code=400, detail="Weeks must be different.")
 
-    result = generate_week_insights(current_week, previous_week)
+
+# Async so the worker is free while waiting on Groq; the fetch and context
+# steps are in-memory lookups and run inline.
+@app.get("/ai/insights", response_model=AIInsightsResponse)
+async def ai_insights(current_week: int, previous_week: int):
+    validate_insight_weeks(current_week, previous_week)
+
+    result = await generate_week_insights(current_week, previous_week)
 
     return AIInsightsResponse(**result)
 
 
+@app.get("/ai/insights/stream")
+async def ai_insights_stream(current_week: int, previous_week: int):
+    validate_insight_weeks(current_week, previous_week)
+
+    # Server-sent events: "delta" events carry raw LLM text as it arrives,
+    # the final "result" event carries the AIInsightsResponse payload.
+    async def events():
+        async for event, payload in stream_week_insights(current_week, previous_week):
+            if event == "result":
+                payload = AIInsightsResponse(**payload).model_dump()
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
@@ -1,9 +1,11 @@
 import json
+import weakref
+from bisect import bisect_right
+from functools import cached_property, lru_cache
 import pandas as pd
 import numpy as np
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 from typing import Optional
-from scipy import stats
 
 WEIGHTS = {
     "picking": 0.4,
@@ -19,8 +21,69 @@ ALERT_THRESHOLDS = {
     "error_rate":     {"warning": 0.3, "critical": 0.5},
 }
 
+ALERT_METRICS = tuple(ALERT_THRESHOLDS)
+ALERT_LEVELS  = (None, "warning", "critical")
+
+# Row-wise view for scoring a week: (metric, is_low_good, warning, critical,
+# title), in ALERT_METRICS order. Whether a value breaches is decided only by
+# _alert_level.
+ALERT_RULES = tuple(
+    (m, m == "error_rate", t["warning"], t["critical"], m.replace("_", " ").title())
+    for m, t in ALERT_THRESHOLDS.items()
+)
+
+# Per-row limits for the optional operational columns, by tier: a row above
+# a tier's limit is worse than that tier. Times are in minutes.
+BENCHMARKS = {
+    "pick_time":      {"excellent": 12, "good": 18, "average": 24, "poor": 30},
+    "pack_time":      {"excellent": 8,  "good": 12, "average": 16, "poor": 20},
+    "dispatch_delay": {"excellent": 15, "good": 25, "average": 35, "poor": 45},
+}
 
-@dataclass
+# Full parse schema so read_csv skips type inference. Scores stay float64:
+# the weekly means are rounded to 2 dp and float32 would move ties. The
+# anomaly feature columns are optional; keys absent from a file are ignored.
+CSV_DTYPES = {
+    "week":            "int32",
+    "delivery_score":  "float64",
+    "accuracy_score":  "float64",
+    "dispatch_score":  "float64",
+    "warehouse_score": "float64",
+    "on_time_score":   "float64",
+    "pick_time":       "float64",
+    "pack_time":       "float64",
+    "dispatch_delay":  "float64",
+    "error_count":     "int32",
+}
+
+# Bucket edges for bucket_index: a value equal to an edge falls in the upper
+# bucket, matching the previous ">=" ladders.
+STATUS_EDGES      = (40, 60, 75)
+STATUS_LABELS     = ("poor", "average", "good", "excellent")
+BENCHMARK_EDGES   = (50, 65, 80)
+BENCHMARK_RATINGS = (("poor", 15.0), ("average", 40.0), ("good", 70.0), ("excellent", 90.0))
+
+SCORE_COLUMNS    = ["warehouse_score", "accuracy_score", "dispatch_score", "delivery_score", "on_time_score"]
+# Metric score -> CSV column it is read from; error_rate is derived from
+# on_time_score in _compute_scores_batch.
+SCORE_SOURCES = {
+    "delivery_score": "delivery_score",
+    "picking_score":  "warehouse_score",
+    "packing_score":  "accuracy_score",
+    "dispatch_score": "dispatch_score",
+}
+FORECAST_COLUMNS = [("delivery_score", "delivery_score"), ("dispatch_score", "dispatch_score"), ("warehouse_score", "picking_score")]
+
+
+def bucket_index(edges: tuple, value: float) -> int:
+    # bisect_right alone would put NaN (a week with missing scores) in the
+    # top bucket; the old ladders failed every ">=" and gave the bottom one.
+    if not value >= edges[0]:
+        return 0
+    return bisect_right(edges, value)
+
+
+@dataclass(slots=True)
 class Alert:
     metric: str
     level: str
@@ -29,7 +92,7 @@ class Alert:
     message: str
 
 
-@dataclass
+@dataclass(slots=True)
 class BenchmarkRating:
     metric: str
     value: float
@@ -37,7 +100,7 @@ class BenchmarkRating:
     percentile_estimate: float
 
 
-@dataclass
+@dataclass(slots=True)
 class Forecast:
     metric: str
     next_week_value: float
@@ -47,6 +110,18 @@ class Forecast:
     confidence: str
 
 
+@dataclass(slots=True)
+class WeekScores:
+    # The headline numbers of WeekMetrics without alerts, benchmarks or
+    # forecasts; enough for simulation and root-cause work.
+    week: int
+    picking_score: float
+    packing_score: float
+    dispatch_score: float
+    delivery_score: float
+    error_rate: float
+
+
 @dataclass
 class WeekMetrics:
     week: int
@@ -61,14 +136,46 @@ class WeekMetrics:
     forecasts: list = field(default_factory=list)
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        # Spelled out instead of dataclasses.asdict, which deep-copies
+        # recursively; every value here is already a plain scalar.
+        return {
+            "week":           self.week,
+            "picking_score":  self.picking_score,
+            "packing_score":  self.packing_score,
+            "dispatch_score": self.dispatch_score,
+            "delivery_score": self.delivery_score,
+            "error_rate":     self.error_rate,
+            "sample_size":    self.sample_size,
+            "alerts": [
+                {"metric": a.metric, "level": a.level, "value": a.value,
+                 "threshold": a.threshold, "message": a.message}
+                for a in self.alerts
+            ],
+            "benchmarks": [
+                {"metric": b.metric, "value": b.value, "rating": b.rating,
+                 "percentile_estimate": b.percentile_estimate}
+                for b in self.benchmarks
+            ],
+            "forecasts": [
+                {"metric": f.metric, "next_week_value": f.next_week_value, "trend": f.trend,
+                 "slope": f.slope, "r_squared": f.r_squared, "confidence": f.confidence}
+                for f in self.forecasts
+            ],
+        }
+
+    @cached_property
+    def alerts_by_metric(self) -> dict:
+        by_metric = {}
+        for a in self.alerts:
+            by_metric.setdefault(a.metric, []).append(a)
+        return by_metric
 
     def to_metric_tree(self) -> dict:
         return {
             "name": "Delivery Timeliness",
             "value": self.delivery_score,
             "status": self._score_status(self.delivery_score),
-            "alerts": [a.level for a in self.alerts if a.metric == "delivery_score"],
+            "alerts": [a.level for a in self.alerts_by_metric.get("delivery_score", ())],
             "children": [
                 {"name": "Picking Efficiency",   "value": self.picking_score,  "weight": WEIGHTS["picking"],  "status": self._score_status(self.picking_score)},
                 {"name": "Packing Efficiency",   "value": self.packing_score,  "weight": WEIGHTS["packing"],  "status": self._score_status(self.packing_score)},
@@ -78,50 +185,75 @@ class WeekMetrics:
 
     @staticmethod
     def _score_status(score: float) -> str:
-        if score >= 75: return "excellent"
-        if score >= 60: return "good"
-        if score >= 40: return "average"
-        return "poor"
+        return STATUS_LABELS[bucket_index(STATUS_EDGES, score)]
+
 
+def _alert_level(value: float, is_low_good: bool, warning: float, critical: float) -> int:
+    # Index into ALERT_LEVELS; a value equal to a threshold breaches it. NaN
+    # (missing metric) fails every comparison and never alerts.
+    if is_low_good:
+        return 2 if value >= critical else 1 if value >= warning else 0
+    return 2 if value <= critical else 1 if value <= warning else 0
 
-def _generate_alerts(metrics: dict) -> list:
+
+def _generate_alerts(
+    delivery_score: float,
+    picking_score: float,
+    packing_score: float,
+    dispatch_score: float,
+    error_rate: float,
+) -> list:
+    values = (delivery_score, picking_score, packing_score, dispatch_score, error_rate)
+
+    # Plain comparisons per metric, shared with the compare_weeks alert
+    # counts; messages are only formatted for alerts that actually fire.
     alerts = []
-    for metric, thresholds in ALERT_THRESHOLDS.items():
-        value = metrics.get(metric)
-        if value is None:
+    for (metric, is_low_good, warning, critical, title), value in zip(ALERT_RULES, values):
+        level = _alert_level(value, is_low_good, warning, critical)
+        if not level:
             continue
-
-        is_low_good = metric == "error_rate"
-        critical, warning = thresholds["critical"], thresholds["warning"]
-
-        if is_low_good:
-            level = "critical" if value >= critical else "warning" if value >= warning else None
-        else:
-            level = "critical" if value <= critical else "warning" if value <= warning else None
-
-        if level:
-            threshold = critical if level == "critical" else warning
-            alerts.append(Alert(
-                metric=metric,
-                level=level,
-                value=round(value, 2),
-                threshold=threshold,
-                message=(
-                    f"{metric.replace('_', ' ').title()} is {level.upper()}: {value:.2f} "
-                    f"({'above' if is_low_good else 'below'} threshold of {threshold})"
-                ),
-            ))
+        level     = ALERT_LEVELS[level]
+        threshold = critical if level == "critical" else warning
+        alerts.append(Alert(
+            metric=metric,
+            level=level,
+            value=round(value, 2),
+            threshold=threshold,
+            message=(
+                f"{title} is {level.upper()}: {value:.2f} "
+                f"({'above' if is_low_good else 'below'} threshold of {threshold})"
+            ),
+        ))
     return alerts
 
 
+@lru_cache(maxsize=64)
+def _centered_x(n: int) -> tuple[float, np.ndarray, float]:
+    # x is always arange(n), so its mean, centered values and variance depend
+    # only on n. Values are exact for any realistic n, matching x.mean() etc.
+    x_mean = (n - 1) / 2
+    dx = np.arange(n, dtype=np.float64) - x_mean
+    dx.setflags(write=False)
+    return x_mean, dx, (n * n - 1) / 12
+
+
 def _forecast_metric(series: pd.Series, metric_name: str) -> Optional[Forecast]:
     if len(series) < 3:
         return None
 
-    x = np.arange(len(series))
-    slope, intercept, r_value, _, _ = stats.linregress(x, series.values)
-    next_value = intercept + slope * len(series)
-    r_squared  = r_value ** 2
+    # Closed-form least squares; scipy.stats.linregress costs more in call
+    # overhead than the math itself for a handful of weekly points.
+    n  = len(series)
+    x_mean, dx, ss_x = _centered_x(n)
+    y  = series.to_numpy(dtype=np.float64)
+    y_mean = y.mean()
+    dy = y - y_mean
+    ss_y  = dy @ dy / n
+    ss_xy = dx @ dy / n
+    slope      = ss_xy / ss_x
+    intercept  = y_mean - slope * x_mean
+    next_value = intercept + slope * n
+    r_squared  = min(ss_xy * ss_xy / (ss_x * ss_y), 1.0) if ss_y else 0.0
     trend      = "stable" if abs(slope) <= 0.5 else ("improving" if slope > 0 else "degrading")
     confidence = "high" if r_squared > 0.7 else "medium" if r_squared > 0.4 else "low"
 
@@ -136,7 +268,7 @@ def _forecast_metric(series: pd.Series, metric_name: str) -> Optional[Forecast]:
 
 
 def load_data(path: str = "sample_Data.csv") -> pd.DataFrame:
-    df = pd.read_csv(path)
+    df = pd.read_csv(path, dtype=CSV_DTYPES)
     required = {"week", "delivery_score", "accuracy_score", "dispatch_score", "warehouse_score", "on_time_score"}
     missing = required - set(df.columns)
     if missing:
@@ -144,49 +276,156 @@ def load_data(path: str = "sample_Data.csv") -> pd.DataFrame:
     return df
 
 
+# Derived per-frame data keyed by id(df). Entries are dropped when the frame
+# is garbage-collected, so a recycled id can never pick up stale results.
+# Frames are treated as read-only once loaded.
+_frame_cache: dict[int, dict] = {}
+
+
+def _frame_cache_for(df: pd.DataFrame) -> dict:
+    key = id(df)
+    cache = _frame_cache.get(key)
+    if cache is None:
+        cache = _frame_cache[key] = {}
+        weakref.finalize(df, _frame_cache.pop, key, None)
+    return cache
+
+
 def calculate_week_metrics(week: int, df: Optional[pd.DataFrame] = None) -> WeekMetrics:
     if df is None:
         df = load_data()
 
-    df_week = df[df["week"] == week]
-    if df_week.empty:
-        raise ValueError(f"No data found for week {week}.")
+    # Memoized per frame: simulations, stress tests and root-cause pairs ask
+    # for the same week repeatedly. The result is shared, so callers must not
+    # mutate it.
+    cache = _frame_cache_for(df).setdefault("week_metrics", {})
+    metrics = cache.get(week)
+    if metrics is None:
+        metrics = cache[week] = _compute_week_metrics(week, df)
+    return metrics
+
+
+def calculate_week_scores(week: int, df: Optional[pd.DataFrame] = None) -> WeekScores:
+    if df is None:
+        df = load_data()
 
-    # Map CSV columns to metric scores
-    picking_score  = float(df_week["warehouse_score"].mean())
-    packing_score  = float(df_week["accuracy_score"].mean())
-    dispatch_score = float(df_week["dispatch_score"].mean())
-    delivery_score = float(df_week["delivery_score"].mean())
+    # Same values as calculate_week_metrics, read straight from the cached
+    # weekly score frame; also memoized and shared per frame.
+    cache = _frame_cache_for(df).setdefault("week_scores", {})
+    scores = cache.get(week)
+    if scores is None:
+        weekly = _weekly_scores(df)
+        if week not in weekly.index:
+            raise ValueError(f"No data found for week {week}.")
+        row = weekly.loc[week]
+        scores = cache[week] = WeekScores(
+            week=week,
+            picking_score=round(float(row["picking_score"]), 2),
+            packing_score=round(float(row["packing_score"]), 2),
+            dispatch_score=round(float(row["dispatch_score"]), 2),
+            delivery_score=round(float(row["delivery_score"]), 2),
+            error_rate=round(float(row["error_rate"]), 4),
+        )
+    return scores
+
+
+def _aggregate_all_weeks(df: pd.DataFrame) -> pd.DataFrame:
+    # One row per week, sorted: the mean of every score column plus the row
+    # count. Weekly metrics, forecasts and compare_weeks all read from this,
+    # so it is grouped once per frame and shared (read-only).
+    cache = _frame_cache_for(df)
+    agg = cache.get("weekly_agg")
+    if agg is None:
+        agg = cache["weekly_agg"] = df.groupby("week", sort=True).agg(
+            **{col: (col, "mean") for col in SCORE_COLUMNS},
+            n=("week", "size"),
+        )
+    return agg
+
+
+def _compute_scores_batch(agg: pd.DataFrame) -> pd.DataFrame:
+    # Column math over every week at once, one column per ALERT_METRICS entry.
+    # Scores stay unrounded for the alert checks; error_rate is rounded first,
+    # as the alerts have always compared the rounded value.
+    scores = pd.DataFrame(
+        {metric: agg[col].to_numpy(dtype=np.float64) for metric, col in SCORE_SOURCES.items()},
+        index=agg.index,
+    )
     # Derive error_rate from on_time_score (0.0 to 1.0 scale)
-    error_rate     = round(1.0 - float(df_week["on_time_score"].mean()) / 100.0, 4)
+    error_rate = 1.0 - agg["on_time_score"].to_numpy(dtype=np.float64) / 100.0
+    scores["error_rate"] = [round(float(v), 4) for v in error_rate]
+    return scores[list(ALERT_METRICS)]
+
+
+def _weekly_scores(df: pd.DataFrame) -> pd.DataFrame:
+    cache = _frame_cache_for(df)
+    scores = cache.get("weekly_scores")
+    if scores is None:
+        scores = cache["weekly_scores"] = _compute_scores_batch(_aggregate_all_weeks(df))
+    return scores
+
+
+def _weekly_comparison(df: pd.DataFrame) -> pd.DataFrame:
+    # The compare_weeks columns for every week, built once per frame with
+    # column math; comparisons are then row selections.
+    cache = _frame_cache_for(df)
+    table = cache.get("weekly_comparison")
+    if table is None:
+        agg    = _aggregate_all_weeks(df)
+        scores = _weekly_scores(df)
+        # Once per frame, so a Python pass over weeks x metrics is cheap.
+        levels = np.array([
+            [_alert_level(v, low_good, warning, critical)
+             for v, (_, low_good, warning, critical, _) in zip(row, ALERT_RULES)]
+            for row in scores.itertuples(index=False)
+        ]).reshape(len(scores), len(ALERT_RULES))
+        table  = cache["weekly_comparison"] = pd.DataFrame(
+            {
+                "delivery_score":  [round(float(v), 2) for v in scores["delivery_score"]],
+                "picking_score":   [round(float(v), 2) for v in scores["picking_score"]],
+                "packing_score":   [round(float(v), 2) for v in scores["packing_score"]],
+                "dispatch_score":  [round(float(v), 2) for v in scores["dispatch_score"]],
+                "error_rate":      scores["error_rate"].tolist(),
+                "sample_size":     agg["n"].to_numpy(dtype=np.int64),
+                "critical_alerts": (levels == 2).sum(axis=1),
+                "warning_alerts":  (levels == 1).sum(axis=1),
+            },
+            index=agg.index,
+        )
+    return table
+
+
+def _compute_week_metrics(week: int, df: pd.DataFrame) -> WeekMetrics:
+    return _week_metrics_from_agg(week, _aggregate_all_weeks(df), _weekly_scores(df))
+
+
+def _week_metrics_from_agg(week: int, agg: pd.DataFrame, scores: pd.DataFrame) -> WeekMetrics:
+    if week not in agg.index:
+        raise ValueError(f"No data found for week {week}.")
+
+    # Weekly averages up to and including this week feed the forecasts.
+    history = agg.loc[:week]
+
+    row = scores.loc[week]
+    picking_score  = float(row["picking_score"])
+    packing_score  = float(row["packing_score"])
+    dispatch_score = float(row["dispatch_score"])
+    delivery_score = float(row["delivery_score"])
+    error_rate     = float(row["error_rate"])
 
-    alerts = _generate_alerts({
-        "delivery_score": delivery_score,
-        "picking_score":  picking_score,
-        "packing_score":  packing_score,
-        "dispatch_score": dispatch_score,
-        "error_rate":     error_rate,
-    })
+    alerts = _generate_alerts(delivery_score, picking_score, packing_score, dispatch_score, error_rate)
 
     # Forecasts based on historical weekly averages
-    history = df[df["week"] <= week].groupby("week")
     forecasts = []
-    for col, name in [("delivery_score", "delivery_score"), ("dispatch_score", "dispatch_score"), ("warehouse_score", "picking_score")]:
-        f = _forecast_metric(history[col].mean().sort_index(), name)
+    for col, name in FORECAST_COLUMNS:
+        f = _forecast_metric(history[col], name)
         if f:
             forecasts.append(f)
 
     # Simple benchmarks based on score ranges
     benchmarks = []
     for metric_name, value in [("delivery_score", delivery_score), ("dispatch_score", dispatch_score), ("warehouse_score", picking_score)]:
-        if value >= 80:
-            rating, pct = "excellent", 90.0
-        elif value >= 65:
-            rating, pct = "good", 70.0
-        elif value >= 50:
-            rating, pct = "average", 40.0
-        else:
-            rating, pct = "poor", 15.0
+        rating, pct = BENCHMARK_RATINGS[bucket_index(BENCHMARK_EDGES, value)]
         benchmarks.append(BenchmarkRating(metric=metric_name, value=round(value, 2), rating=rating, percentile_estimate=pct))
 
     return WeekMetrics(
@@ -196,7 +435,7 @@ def calculate_week_metrics(week: int, df: Optional[pd.DataFrame] = None) -> Week
         dispatch_score=round(dispatch_score, 2),
         delivery_score=round(delivery_score, 2),
         error_rate=round(error_rate, 4),
-        sample_size=len(df_week),
+        sample_size=int(agg.at[week, "n"]),
         alerts=alerts,
         benchmarks=benchmarks,
         forecasts=forecasts,
@@ -207,25 +446,11 @@ def compare_weeks(weeks: list, df: Optional[pd.DataFrame] = None) -> pd.DataFram
     if df is None:
         df = load_data()
 
-    rows = []
-    for week in weeks:
-        try:
-            m = calculate_week_metrics(week, df=df)
-            rows.append({
-                "week":            m.week,
-                "delivery_score":  m.delivery_score,
-                "picking_score":   m.picking_score,
-                "packing_score":   m.packing_score,
-                "dispatch_score":  m.dispatch_score,
-                "error_rate":      m.error_rate,
-                "sample_size":     m.sample_size,
-                "critical_alerts": sum(1 for a in m.alerts if a.level == "critical"),
-                "warning_alerts":  sum(1 for a in m.alerts if a.level == "warning"),
-            })
-        except ValueError:
-            continue
-
-    result = pd.DataFrame(rows).set_index("week")
+    # Rows of the per-frame comparison table, in the caller's order, instead
+    # of a calculate_week_metrics run per week; unknown weeks are skipped.
+    table   = _weekly_comparison(df)
+    present = [w for w in weeks if w in table.index]
+    result  = table.loc[present].set_axis(pd.Index(present, name="week"))
     if len(result) > 1:
         result["delivery_score_delta"] = result["delivery_score"].diff().round(2)
     return result
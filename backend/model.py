@@ -1,17 +1,39 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass, field
 from typing import Optional
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 
-from metrics import load_data, BENCHMARKS
+from metrics import load_data, BENCHMARKS, SCORE_COLUMNS
 
 
 FEATURES      = ["pick_time", "pack_time", "dispatch_delay", "error_count"]
+# Used when a file has none of FEATURES (the bundled sample only has scores).
+FALLBACK_FEATURES = SCORE_COLUMNS
 CONTAMINATION = 0.15
 
+# Feature -> BENCHMARKS tier it must exceed to count as a trigger.
+BENCHMARK_TRIGGERS = (
+    ("pick_time",      "poor"),
+    ("pack_time",      "poor"),
+    ("dispatch_delay", "poor"),
+)
+ERROR_COUNT_TRIGGER = 3
 
-@dataclass
+# Anomaly scores below -0.15 are critical, below -0.05 high, else moderate.
+SEVERITY_EDGES  = np.array([-0.15, -0.05])
+SEVERITY_LABELS = np.array(["critical", "high", "moderate"], dtype=object)
+
+# Below this many weeks, worker start-up costs more than the fits it spreads.
+PARALLEL_MIN_WEEKS = 4
+
+
+@dataclass(slots=True)
 class Anomaly:
     week: int
     row_index: int
@@ -44,36 +66,47 @@ class AnomalyReport:
             bar = "#" * count
             lines.append(f"    {level:<10} {count:>3}  |{bar}")
 
-        lines += ["", f"  {'Week':<6} {'Severity':<10} {'Score':>7}  Triggers  Explanation"]
-        lines.append("  " + "-" * 70)
-        for a in self.anomalies:
-            triggers = ", ".join(a.triggered_features) or "none"
-            lines.append(
-                f"  {a.week:<6} {a.severity:<10} {a.anomaly_score:>7.4f}  "
-                f"{triggers:<30}  {a.explanation}"
-            )
+        lines.append("")
+        if not self.anomalies:
+            lines.append("  No anomalies detected.")
+            return "\n".join(lines)
+
+        # Let pandas lay out the per-anomaly table in one to_string call. The
+        # last column is appended unpadded so rows carry no trailing spaces.
+        table = pd.DataFrame({
+            "Week":     [str(a.week) for a in self.anomalies],
+            "Severity": [a.severity for a in self.anomalies],
+            "Score":    [a.anomaly_score for a in self.anomalies],
+            "Triggers": [", ".join(a.triggered_features) or "none" for a in self.anomalies],
+        })
+        for col in ("Week", "Severity", "Triggers"):
+            table[col] = table[col].str.ljust(table[col].str.len().max())
+        text = table.to_string(index=False, justify="left", formatters={"Score": "{:.4f}".format})
+        explanations = ["Explanation"] + [a.explanation for a in self.anomalies]
+        lines += [f"  {line} {last}" for line, last in zip(text.splitlines(), explanations)]
         return "\n".join(lines)
 
 
-def _severity(score: float) -> str:
-    if score < -0.15: return "critical"
-    if score < -0.05: return "high"
-    return "moderate"
+def _severities(scores: np.ndarray) -> list[str]:
+    return SEVERITY_LABELS[np.searchsorted(SEVERITY_EDGES, scores, side="right")].tolist()
+
 
+def _find_triggered_features(rows: pd.DataFrame) -> list[list[str]]:
+    # One boolean column per check over all rows at once; features missing
+    # from the frame are simply not checked.
+    names, masks = [], []
+    for col, tier in BENCHMARK_TRIGGERS:
+        if col in rows:
+            names.append(col)
+            masks.append(rows[col].to_numpy() > BENCHMARKS[col][tier])
+    if "error_count" in rows:
+        names.append("error_count")
+        masks.append(rows["error_count"].to_numpy() >= ERROR_COUNT_TRIGGER)
+    if not masks:
+        return [[] for _ in range(len(rows))]
 
-def _find_triggered_features(row: pd.Series) -> list[str]:
-    triggered = []
-    checks = {
-        "pick_time":      ("pick_time",      "poor"),
-        "pack_time":      ("pack_time",      "poor"),
-        "dispatch_delay": ("dispatch_delay", "poor"),
-    }
-    for col, (bench_key, tier) in checks.items():
-        if col in row and row[col] > BENCHMARKS[bench_key][tier]:
-            triggered.append(col)
-    if "error_count" in row and row["error_count"] >= 3:
-        triggered.append("error_count")
-    return triggered
+    names = np.array(names, dtype=object)
+    return [names[hit].tolist() for hit in np.column_stack(masks)]
 
 
 def _explain(triggered: list[str], severity: str) -> str:
@@ -87,38 +120,46 @@ def detect_anomalies(
     df: Optional[pd.DataFrame] = None,
     contamination: float = CONTAMINATION,
     week_filter: Optional[int] = None,
+    n_jobs: Optional[int] = -1,
 ) -> AnomalyReport:
     if df is None:
         df = load_data()
 
+    # Only ever read from: no copies of the frame, and the model outputs stay
+    # as arrays indexed positionally rather than columns on an extended copy.
     if week_filter is not None:
-        df = df[df["week"] == week_filter].copy()
+        df = df[df["week"] == week_filter]
 
-    available      = [f for f in FEATURES if f in df.columns]
-    feature_matrix = df[available].copy()
+    # Isolation trees split on per-feature ranges, so they are scale-invariant
+    # and need no standardisation; the forest works in float32 internally.
+    available      = ([f for f in FEATURES if f in df.columns]
+                      or [f for f in FALLBACK_FEATURES if f in df.columns])
+    feature_matrix = df[available].to_numpy(dtype=np.float32)
 
-    scaler = StandardScaler()
-    scaled = scaler.fit_transform(feature_matrix)
+    model = IsolationForest(contamination=contamination, n_estimators=200, random_state=42, n_jobs=n_jobs)
+    flags = model.fit_predict(feature_matrix)
+    positions = np.flatnonzero(flags == -1)
+    scores = model.decision_function(feature_matrix)[positions]
 
-    model = IsolationForest(contamination=contamination, n_estimators=200, random_state=42)
-    df    = df.copy()
-    df["anomaly_flag"]  = model.fit_predict(scaled)
-    df["anomaly_score"] = model.decision_function(scaled)
+    anomaly_rows = df.iloc[positions]
+    n_rows       = len(anomaly_rows)
 
-    anomaly_rows = df[df["anomaly_flag"] == -1].copy()
+    triggered_by_row = _find_triggered_features(anomaly_rows)
+    weeks  = anomaly_rows["week"].tolist() if "week" in anomaly_rows else [-1] * n_rows
+    values = anomaly_rows[available].to_numpy(dtype=np.float64)
+    scores = [round(s, 6) for s in scores]
 
     anomalies = []
-    for idx, row in anomaly_rows.iterrows():
-        triggered = _find_triggered_features(row)
-        score     = round(row["anomaly_score"], 6)
-        severity  = _severity(score)
+    for idx, week, score, severity, row_values, triggered in zip(
+        anomaly_rows.index.tolist(), weeks, scores, _severities(np.array(scores)), values, triggered_by_row
+    ):
         anomalies.append(Anomaly(
-            week=int(row["week"]) if "week" in row else -1,
+            week=int(week),
             row_index=idx,
             anomaly_score=score,
             severity=severity,
             triggered_features=triggered,
-            values={f: round(row[f], 2) for f in available if f in row},
+            values={f: round(v, 2) for f, v in zip(available, row_values)},
             explanation=_explain(triggered, severity),
         ))
 
@@ -128,8 +169,8 @@ def detect_anomalies(
     for a in anomalies:
         severity_breakdown[a.severity] += 1
 
-    all_triggers = [f for a in anomalies for f in a.triggered_features]
-    most_common  = max(set(all_triggers), key=all_triggers.count) if all_triggers else "none"
+    trigger_counts = Counter(f for a in anomalies for f in a.triggered_features)
+    most_common    = trigger_counts.most_common(1)[0][0] if trigger_counts else "none"
 
     return AnomalyReport(
         total_records=len(df),
@@ -143,13 +184,31 @@ def detect_anomalies(
 
 def detect_anomalies_by_week(
     df: Optional[pd.DataFrame] = None,
+    max_workers: Optional[int] = None,
 ) -> dict[int, AnomalyReport]:
     if df is None:
         df = load_data()
-    return {
-        int(week): detect_anomalies(df=df, week_filter=int(week))
-        for week in sorted(df["week"].unique())
-    }
+
+    # Each week is an independent IsolationForest fit, so they are spread over
+    # worker processes; only each week's own rows are pickled to a worker.
+    groups = [(int(week), frame) for week, frame in df.groupby("week", sort=True)]
+    frames = [frame for _, frame in groups]
+    if max_workers is None:
+        max_workers = min(len(groups), os.cpu_count() or 1)
+
+    reports = None
+    if max_workers > 1 and len(groups) >= PARALLEL_MIN_WEEKS:
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                # One process per week already; keep each fit single-threaded.
+                reports = list(pool.map(partial(detect_anomalies, n_jobs=1), frames))
+        except (OSError, BrokenProcessPool):
+            # No usable process pool here (sandboxed or restricted host).
+            reports = None
+    if reports is None:
+        reports = [detect_anomalies(df=frame) for frame in frames]
+
+    return {week: report for (week, _), report in zip(groups, reports)}
 
 
 if __name__ == "__main__":
@@ -2,9 +2,9 @@ from dataclasses import dataclass
 from typing import Optional
 import pandas as pd
 
-from metrics import calculate_week_metrics, compare_weeks, WEIGHTS
+from metrics import WeekScores, calculate_week_scores, compare_weeks, load_data, WEIGHTS
 
-@dataclass
+@dataclass(slots=True)
 class ImpactFactor:
     metric: str
     previous: float
@@ -36,12 +36,23 @@ class RootCauseReport:
             "",
             "  Impact Breakdown:",
         ]
-        for d in self.drivers:
-            bar = "#" * int(abs(d.weighted_impact) / 2)
-            lines.append(
-                f"    {d.metric:<20}  change={d.change:+.2f}  "
-                f"impact={d.weighted_impact:+.2f}  {d.direction:<11}  |{bar}"
+        if self.drivers:
+            # The bar column is appended unpadded so rows carry no trailing
+            # spaces.
+            table = pd.DataFrame({
+                "metric":    [d.metric for d in self.drivers],
+                "change":    [d.change for d in self.drivers],
+                "impact":    [d.weighted_impact for d in self.drivers],
+                "direction": [d.direction for d in self.drivers],
+            })
+            for col in ("metric", "direction"):
+                table[col] = table[col].str.ljust(table[col].str.len().max())
+            text = table.to_string(
+                index=False, justify="left",
+                formatters={"change": "{:+.2f}".format, "impact": "{:+.2f}".format},
             )
+            bars = ["bar"] + ["|" + "#" * int(abs(d.weighted_impact) / 2) for d in self.drivers]
+            lines += [f"    {line} {bar}" for line, bar in zip(text.splitlines(), bars)]
         lines += ["", f"  Verdict: {self.verdict}"]
         return "\n".join(lines)
 
@@ -51,9 +62,12 @@ def root_cause_analysis(
     previous_week: int,
     df: Optional[pd.DataFrame] = None,
 ) -> RootCauseReport:
-    current  = calculate_week_metrics(current_week,  df=df)
-    previous = calculate_week_metrics(previous_week, df=df)
+    current  = calculate_week_scores(current_week,  df=df)
+    previous = calculate_week_scores(previous_week, df=df)
+    return _build_report(current, previous)
+
 
+def _build_report(current: WeekScores, previous: WeekScores) -> RootCauseReport:
     score_map = {
         "picking_score":  ("picking",  current.picking_score,  previous.picking_score),
         "packing_score":  ("packing",  current.packing_score,  previous.packing_score),
@@ -84,8 +98,8 @@ def root_cause_analysis(
 
     return RootCauseReport(
         kpi="Delivery Timeliness",
-        current_week=current_week,
-        previous_week=previous_week,
+        current_week=current.week,
+        previous_week=previous.week,
         previous_score=previous.delivery_score,
         current_score=current.delivery_score,
         total_drop=total_drop,
@@ -112,15 +126,19 @@ def _generate_verdict(drop: float, drivers: list[ImpactFactor], error_rate: floa
 
 
 def multi_week_root_cause(weeks: list[int], df: Optional[pd.DataFrame] = None) -> list[RootCauseReport]:
+    if df is None:
+        df = load_data()
+
+    # Each week's scores are fetched once and shared by the two pairs it
+    # belongs to.
+    scores = {w: calculate_week_scores(w, df=df) for w in weeks}
     return [
-        root_cause_analysis(weeks[i], weeks[i - 1], df=df)
-        for i in range(1, len(weeks))
+        _build_report(scores[curr], scores[prev])
+        for prev, curr in zip(weeks, weeks[1:])
     ]
 
 
 if __name__ == "__main__":
-    from metrics import load_data
-
     df    = load_data()
     weeks = sorted(df["week"].unique())
 
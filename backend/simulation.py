@@ -1,11 +1,12 @@
 from dataclasses import dataclass
 from typing import Optional
+import numpy as np
 import pandas as pd
 
-from metrics import calculate_week_metrics, WEIGHTS
+from metrics import WeekMetrics, WeekScores, bucket_index, calculate_week_scores, WEIGHTS
 
 
-@dataclass
+@dataclass(slots=True)
 class ScenarioResult:
     label: str
     order_increase_pct: float
@@ -46,15 +47,32 @@ class LoadSimulationReport:
         return "\n".join(lines)
 
 
+RISK_EDGES  = (40, 55, 70)
+RISK_LEVELS = ("critical", "high", "moderate", "low")
+
+
 def _risk_level(delivery_score: float) -> str:
-    if delivery_score >= 70: return "low"
-    if delivery_score >= 55: return "moderate"
-    if delivery_score >= 40: return "high"
-    return "critical"
+    return RISK_LEVELS[bucket_index(RISK_EDGES, delivery_score)]
+
 
+W_PICKING, W_PACKING, W_DISPATCH = WEIGHTS["picking"], WEIGHTS["packing"], WEIGHTS["dispatch"]
 
-def _apply_load(base_score: float, increase_factor: float, elasticity: float = 1.0) -> float:
-    return round(base_score / (increase_factor ** elasticity), 2)
+
+def _scenario_kernel(
+    picking: float,
+    packing: float,
+    dispatch: float,
+    base_delivery: float,
+    increase_factor: float,
+    picking_elasticity: float,
+    dispatch_elasticity: float,
+) -> tuple[float, float, float, float]:
+    # All of a scenario's arithmetic on plain floats: the loaded picking and
+    # dispatch scores, the new delivery score and its delta from baseline.
+    new_picking  = round(picking  / (increase_factor ** picking_elasticity),  2)
+    new_dispatch = round(dispatch / (increase_factor ** dispatch_elasticity), 2)
+    new_delivery = round(W_PICKING * new_picking + W_PACKING * packing + W_DISPATCH * new_dispatch, 2)
+    return new_picking, new_dispatch, new_delivery, round(new_delivery - base_delivery, 2)
 
 
 def simulate_scenario(
@@ -64,18 +82,15 @@ def simulate_scenario(
     picking_elasticity: float = 1.0,
     dispatch_elasticity: float = 1.2,
     df: Optional[pd.DataFrame] = None,
+    baseline: Optional[WeekScores | WeekMetrics] = None,
 ) -> ScenarioResult:
-    m               = calculate_week_metrics(week, df=df)
+    m               = baseline or calculate_week_scores(week, df=df)
     increase_factor = 1 + (order_increase_pct / 100)
     label           = label or f"+{order_increase_pct:.0f}% orders"
 
-    new_picking  = _apply_load(m.picking_score,  increase_factor, picking_elasticity)
-    new_dispatch = _apply_load(m.dispatch_score, increase_factor, dispatch_elasticity)
-    new_delivery = round(
-        WEIGHTS["picking"]  * new_picking +
-        WEIGHTS["packing"]  * m.packing_score +
-        WEIGHTS["dispatch"] * new_dispatch,
-        2,
+    new_picking, new_dispatch, new_delivery, delta = _scenario_kernel(
+        m.picking_score, m.packing_score, m.dispatch_score, m.delivery_score,
+        increase_factor, picking_elasticity, dispatch_elasticity,
     )
 
     return ScenarioResult(
@@ -85,7 +100,7 @@ def simulate_scenario(
         packing_score=m.packing_score,
         dispatch_score=new_dispatch,
         delivery_score=new_delivery,
-        delivery_delta=round(new_delivery - m.delivery_score, 2),
+        delivery_delta=delta,
         risk_level=_risk_level(new_delivery),
     )
 
@@ -94,17 +109,19 @@ def simulate_load(
     week: int,
     order_increase_pct: float,
     df: Optional[pd.DataFrame] = None,
+    baseline: Optional[WeekScores | WeekMetrics] = None,
 ) -> ScenarioResult:
-    return simulate_scenario(week, order_increase_pct, df=df)
+    return simulate_scenario(week, order_increase_pct, df=df, baseline=baseline)
 
 
 def simulate_load_range(
     week: int,
     increments: list[float],
     df: Optional[pd.DataFrame] = None,
+    baseline: Optional[WeekScores | WeekMetrics] = None,
 ) -> LoadSimulationReport:
-    base      = calculate_week_metrics(week, df=df)
-    scenarios = [simulate_scenario(week, pct, df=df) for pct in increments]
+    base      = baseline or calculate_week_scores(week, df=df)
+    scenarios = [simulate_scenario(week, pct, df=df, baseline=base) for pct in increments]
     breaking  = next((s.order_increase_pct for s in scenarios if s.delivery_score < 40), None)
 
     return LoadSimulationReport(
@@ -122,17 +139,14 @@ def stress_test(
     max_increase: float = 100.0,
     df: Optional[pd.DataFrame] = None,
 ) -> LoadSimulationReport:
-    increments = [round(i, 1) for i in _frange(step, max_increase + step, step)]
+    # Counted in whole steps: arange with a fractional step can overshoot
+    # max_increase by one. The small slack absorbs float error in the
+    # division, e.g. 2.1 / 0.3 == 7.000000000000001 or 0.3 / 0.1 < 3.
+    n = int(max_increase / step + 1e-9)
+    increments = np.round(step * np.arange(1, n + 1), 1).tolist()
     return simulate_load_range(week, increments, df=df)
 
 
-def _frange(start: float, stop: float, step: float):
-    val = start
-    while val <= stop:
-        yield val
-        val += step
-
-
 if __name__ == "__main__":
     from metrics import load_data
     df     = load_data()